@@ -3,11 +3,34 @@ import requests
 import pandas as pd
 import time
 import os
+import io
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 
 # =============================================================================
 # Spoonacular API Configuration
 # =============================================================================
 
+# Number of recipes fetched per Recipe Wizard search page
+RECIPES_PAGE_SIZE = 12
+
+# Maximum number of images analyzed in parallel by the batch classifier
+MAX_CLASSIFY_WORKERS = 4
+
+# Columns of the batch classifier result table, in display order
+CLASSIFY_RESULT_TEMPLATE = {
+    'File': None,
+    'Duplicate Of': None,
+    'Status': 'Failed',
+    'Category': None,
+    'Probability': None,
+    'Calories (kcal)': None,
+    'Fat (g)': None,
+    'Protein (g)': None,
+    'Carbohydrates (g)': None,
+    'Top Recipe': None
+}
+
 # Add FontAwesome CSS for icons
 st.markdown('<link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/5.15.4/css/all.min.css">', unsafe_allow_html=True)
 
@@ -34,28 +57,98 @@ def get_recipes(params, api_key):
     response = requests.get(url, headers=headers, params=params)
     return response.json()
 
-# Function to get recipe details
-def get_recipe_details(recipe_id, api_key):
+# Function to fetch recipe details (cached so expanding a card or rerunning the app doesn't refetch it).
+# Errors are raised rather than returned, because Streamlit does not cache exceptions.
+@st.cache_data(ttl=3600, show_spinner=False)
+def fetch_recipe_details(recipe_id, api_key):
     url = f'https://api.spoonacular.com/recipes/{recipe_id}/information'
     params = {
         'apiKey': api_key,
         'includeNutrition': True
     }
     response = requests.get(url, params=params)
+    response.raise_for_status()
     return response.json()
 
+# Function to get recipe details, returning an empty dict when the API call fails
+def get_recipe_details(recipe_id, api_key):
+    try:
+        return fetch_recipe_details(recipe_id, api_key)
+    except (requests.RequestException, ValueError):
+        return {}
+
 # Function to get meal types
 def get_meal_types():
     return ['Breakfast', 'Lunch', 'Dinner']
 
-# Function to call Spoonacular Image Analysis API
-def analyze_image(image_path, api_key):
+# Function to call Spoonacular Image Analysis API on in-memory image bytes (safe to run in worker threads)
+def analyze_image(image_bytes, file_name, api_key):
     url = "https://api.spoonacular.com/food/images/analyze"
-    files = {'file': open(image_path, 'rb')}
+    files = {'file': (file_name, image_bytes)}
     params = {'apiKey': api_key}
     response = requests.post(url, files=files, params=params)
+    response.raise_for_status()  # Quota, auth and server errors must not look like "not classified"
     return response.json()
 
+# Function to classify one image of a batch into a result table row
+def classify_image_row(file_name, image_bytes, api_key):
+    row = dict(CLASSIFY_RESULT_TEMPLATE, File=file_name)
+    try:
+        classify_response = analyze_image(image_bytes, file_name, api_key)
+    except (requests.RequestException, ValueError):
+        return row
+    if not isinstance(classify_response, dict):
+        return row
+    if 'category' not in classify_response:
+        row['Status'] = 'Not classified'
+        return row
+
+    # An unexpected response shape only fails this image, not the whole album
+    try:
+        result = {
+            'Status': 'Done',
+            'Category': classify_response['category']['name'],
+            'Probability': round(classify_response['category']['probability'], 2)
+        }
+        if 'nutrition' in classify_response:
+            nutrition_profile = classify_response['nutrition']
+            result['Calories (kcal)'] = nutrition_profile['calories']['value']
+            result['Fat (g)'] = nutrition_profile['fat']['value']
+            result['Protein (g)'] = nutrition_profile['protein']['value']
+            result['Carbohydrates (g)'] = nutrition_profile['carbs']['value']
+        if classify_response.get('recipes'):
+            result['Top Recipe'] = classify_response['recipes'][0]['title']
+    except (KeyError, IndexError, TypeError):
+        return row
+    row.update(result)
+    return row
+
+# Function to store a batch result as soon as its upload finishes, even if the script run that submitted it was interrupted
+def store_classify_result(results, in_flight, image_hash, file_name):
+    def callback(future):
+        if not future.cancelled():
+            if future.exception() is None:
+                results[image_hash] = future.result()
+            else:
+                results[image_hash] = dict(CLASSIFY_RESULT_TEMPLATE, File=file_name)
+        in_flight.discard(image_hash)
+    return callback
+
+# Function to build one result table row per uploaded file, reusing the shared result of identical pictures
+def build_album_rows(album, results, analyzing=()):
+    rows = []
+    first_file_names = {}
+    for file_name, image_hash in album:
+        if image_hash in results:
+            row = dict(CLASSIFY_RESULT_TEMPLATE, **results[image_hash])
+        else:
+            row = dict(CLASSIFY_RESULT_TEMPLATE, Status='Analyzing' if image_hash in analyzing else 'Queued')
+        row['File'] = file_name
+        row['Duplicate Of'] = first_file_names.get(image_hash)
+        first_file_names.setdefault(image_hash, file_name)
+        rows.append(row)
+    return rows
+
 # Function to get similar recipes
 def get_similar_recipes(recipe_id, api_key):
     url = f'https://api.spoonacular.com/recipes/{recipe_id}/similar'
@@ -79,7 +172,8 @@ def get_favorites(api_key):
     favorite_recipes = []
     for recipe_id in favorites:
         recipe_details = get_recipe_details(recipe_id, api_key)
-        favorite_recipes.append(recipe_details)
+        if 'title' in recipe_details:  # Skip recipes whose details could not be fetched
+            favorite_recipes.append(recipe_details)
     return favorite_recipes
 
 # Function to remove favorite recipes
@@ -196,46 +290,63 @@ else:
             params = {
                 'includeIngredients': selected_ingredients,
                 'maxReadyTime': max_ready_time,
-                'number': 3,  # Number of recipes to fetch
+                'number': RECIPES_PAGE_SIZE,  # Number of recipes to fetch per page
+                'offset': 0,
                 'instructionsRequired': True,
                 'addRecipeInformation': True
             }
+            st.session_state.recipe_params = params.copy()
 
             with st.spinner('Whipping up some recipes...'):
                 recipes = get_recipes(params, api_key)
-                st.session_state.recipes = recipes.get('results', [])
+            if 'results' in recipes:
+                st.session_state.recipes = recipes['results']
+                st.session_state.recipes_total = recipes.get('totalResults', len(st.session_state.recipes))
+            else:
+                st.session_state.pop('recipes', None)
+                st.error(f"Oops! The recipe search failed: {recipes.get('message', 'unknown error')}. Please try again later. 🍲")
 
         if 'recipes' in st.session_state:
             st.markdown("<h2 style='text-align: center;'>Lumine’s Recipe Picks 🍝</h2>", unsafe_allow_html=True)
             st.markdown("<h4 style='text-align: center;'>Here are some delicious recipes that match your preferences!</h4>", unsafe_allow_html=True)
 
+            if not st.session_state.recipes:
+                st.write("No recipes found. Please try another combination.")
+
             for recipe in st.session_state.recipes:
-                recipe_details = get_recipe_details(recipe['id'], api_key)
+                # Card header comes straight from the search results, no extra request needed
+                price_per_serving_usd = recipe.get('pricePerServing', 0) / 100  # pricePerServing is in cents
+                price_per_serving_eur = convert_usd_to_eur(price_per_serving_usd)
+
+                col1, col2 = st.columns([9, 1])
+                with col1:
+                    st.subheader(f"{recipe['title']} (€{price_per_serving_eur:.2f} Per Serving) 🍽️")
+                with col2:
+                    col2_1, col2_2 = st.columns([3, 1])
+                    with col2_1:
+                        if st.button('❤️', key=f"fav-{recipe['id']}"):
+                            if len(st.session_state.get('favorites', [])) < 7:  # Limit to 7 favorites
+                                save_favorite(recipe['id'])
+                                st.toast('Recipe Added! Hooray', icon='🎉')
+                                time.sleep(0.75)
+                                st.toast("Check it out in Chef's Favorites!", icon = "👨‍🍳")
+                            else:
+                                st.toast("Chef, you need to remove some of your favorite recipes! 🍲")
+                    with col2_2:
+                        if st.button('🔗', key=f"link-{recipe['id']}"):
+                            js = f"window.open('{recipe['sourceUrl']}', '_blank')"
+                            html = f"<script>{js}</script>"
+                            st.markdown(html, unsafe_allow_html=True)
+
+                st.write(f"*Ready in {recipe['readyInMinutes']} minutes. Servings: {recipe['servings']}*")
+
+                # Image, ingredients, instructions and nutrition are only fetched and rendered once the card is expanded
+                if not st.toggle('Show recipe details 🔍', key=f"details-{recipe['id']}"):
+                    continue
+
+                with st.spinner('Fetching the recipe details...'):
+                    recipe_details = get_recipe_details(recipe['id'], api_key)
                 if 'title' in recipe_details:
-                    price_per_serving_usd = recipe_details.get('pricePerServing', 0) / 100  # pricePerServing is in cents
-                    price_per_serving_eur = convert_usd_to_eur(price_per_serving_usd)
-
-                    col1, col2 = st.columns([9, 1])
-                    with col1:
-                        st.subheader(f"{recipe_details['title']} (€{price_per_serving_eur:.2f} Per Serving) 🍽️")
-                    with col2:
-                        col2_1, col2_2 = st.columns([3, 1])
-                        with col2_1:
-                            if st.button('❤️', key=f"fav-{recipe['id']}"):
-                                if len(st.session_state.get('favorites', [])) < 7:  # Limit to 7 favorites
-                                    save_favorite(recipe['id'])
-                                    st.toast('Recipe Added! Hooray', icon='🎉')
-                                    time.sleep(0.75)
-                                    st.toast("Check it out in Chef's Favorites!", icon = "👨‍🍳")
-                                else:
-                                    st.toast("Chef, you need to remove some of your favorite recipes! 🍲")
-                        with col2_2:
-                            if st.button('🔗', key=f"link-{recipe['id']}"):
-                                js = f"window.open('{recipe_details['sourceUrl']}', '_blank')"
-                                html = f"<script>{js}</script>"
-                                st.markdown(html, unsafe_allow_html=True)
-
-                    st.write(f"*Ready in {recipe_details['readyInMinutes']} minutes. Servings: {recipe_details['servings']}*")
                     st.image(recipe_details['image'], use_column_width=True)
                     source_name = recipe_details.get('sourceName', 'Recipe')
                     st.markdown(f"Source: [{source_name}]({recipe_details['sourceUrl']})")
@@ -270,6 +381,25 @@ else:
                 else:
                     st.write("Recipe details not found. Please try another combination.")
 
+            # Fetch the next page of results using the offset of the recipes already shown
+            if len(st.session_state.recipes) < st.session_state.get('recipes_total', 0):
+                if st.button("Show Me More Recipes 🍲"):
+                    params = st.session_state.recipe_params.copy()
+                    params['offset'] = len(st.session_state.recipes)
+                    with st.spinner('Whipping up some more recipes...'):
+                        recipes = get_recipes(params, api_key)
+                    if 'results' in recipes:
+                        seen_ids = {recipe['id'] for recipe in st.session_state.recipes}
+                        new_recipes = [recipe for recipe in recipes['results'] if recipe['id'] not in seen_ids]
+                        if new_recipes:
+                            st.session_state.recipes += new_recipes
+                        else:
+                            # Nothing new came back, stop offering more pages
+                            st.session_state.recipes_total = len(st.session_state.recipes)
+                        st.experimental_rerun()
+                    else:
+                        st.error(f"Oops! We couldn't fetch more recipes: {recipes.get('message', 'unknown error')}. Please try again later. 🍲")
+
         # Footer
         st.markdown("---")
         st.markdown(
@@ -576,21 +706,26 @@ else:
             Upload a picture of your food and let the magic of AI tell you what it is. This tool will classify your food and provide matching recipes. Simply upload an image and see what it has cooked!
         """)
 
+        classifier_mode = st.radio("Choose how many pictures you want to classify:", ["Single Picture 📷", "Whole Album 🖼️"], horizontal=True)
+
         # Upload image
-        uploaded_file = st.file_uploader("Upload a food picture and see what happens...", type=["jpg", "jpeg", "png"])
+        uploaded_file = None
+        if classifier_mode == "Single Picture 📷":
+            uploaded_file = st.file_uploader("Upload a food picture and see what happens...", type=["jpg", "jpeg", "png"])
 
         if uploaded_file is not None:
             # Display uploaded image
             st.image(uploaded_file, caption='Uploaded Image', use_column_width=True)
 
-            # Save uploaded image to a temporary file
-            with open("temp_classify_image.jpg", "wb") as f:
-                f.write(uploaded_file.getbuffer())
-
             # Call Spoonacular API to analyze image
             with st.spinner('Analyzing image...'):
-                classify_response = analyze_image("temp_classify_image.jpg", api_key)
-            if 'category' in classify_response:
+                try:
+                    classify_response = analyze_image(uploaded_file.getvalue(), uploaded_file.name, api_key)
+                except (requests.RequestException, ValueError):
+                    classify_response = None
+            if classify_response is None:
+                st.error("Oops! We couldn't reach the image analysis service, or you've stirred up too many requests today. Please try again later. 🍲")
+            elif 'category' in classify_response:
                 food_category = classify_response['category']['name']
                 probability = classify_response['category']['probability']
                 st.subheader(f"🧐 I think this is **{food_category}** with a probability of {probability:.2f}!")
@@ -675,4 +810,105 @@ else:
                 </div>
                 """,
                 unsafe_allow_html=True
-                )
\ No newline at end of file
+                )
+
+        # =============================================================================
+        # Batch (album) classification mode
+        # =============================================================================
+        if classifier_mode == "Whole Album 🖼️":
+            uploaded_files = st.file_uploader("Upload your food album and let the classifier do the rest...", type=["jpg", "jpeg", "png"], accept_multiple_files=True)
+
+            if uploaded_files:
+                # Results are kept per image hash, so identical pictures and reruns (e.g. downloads) are only analyzed once.
+                # Failed results are kept too, so they are only retried when asked to.
+                classified_images = st.session_state.setdefault('classified_images', {})
+                # Images handed to a worker that hasn't finished yet, possibly by an earlier, interrupted run
+                in_flight_images = st.session_state.setdefault('in_flight_images', set())
+
+                album = []
+                unique_images = {}
+                for file in uploaded_files:
+                    image_bytes = file.getvalue()
+                    image_hash = hashlib.sha256(image_bytes).hexdigest()
+                    album.append((file.name, image_hash))
+                    unique_images.setdefault(image_hash, (file.name, image_bytes))
+
+                duplicates = len(album) - len(unique_images)
+                if duplicates:
+                    st.write(f"Found {duplicates} duplicate picture(s) in your album. They share the result of their first copy. 🔁")
+
+                pending = [
+                    (image_hash, file_name, image_bytes)
+                    for image_hash, (file_name, image_bytes) in unique_images.items()
+                    if image_hash not in classified_images and image_hash not in in_flight_images
+                ]
+                progress_bar = st.progress(0, text="Analyzing your album...")
+                results_table = st.empty()
+
+                # Uploads run in a bounded worker pool. Each result is stored by its done-callback, and this thread
+                # only polls to redraw the table, so a rerun mid-batch keeps every finished result.
+                executor = ThreadPoolExecutor(max_workers=MAX_CLASSIFY_WORKERS)
+                try:
+                    futures = {}
+                    for image_hash, file_name, image_bytes in pending:
+                        in_flight_images.add(image_hash)
+                        future = executor.submit(classify_image_row, file_name, image_bytes, api_key)
+                        future.add_done_callback(store_classify_result(classified_images, in_flight_images, image_hash, file_name))
+                        futures[image_hash] = future
+
+                    last_state = None
+                    while True:
+                        completed = sum(image_hash in classified_images for image_hash in unique_images)
+                        analyzing = {
+                            image_hash for image_hash in in_flight_images.copy()  # Workers update the set concurrently
+                            if image_hash not in futures or futures[image_hash].running()
+                        }
+                        if (completed, analyzing) != last_state:
+                            last_state = (completed, analyzing)
+                            progress_bar.progress(completed / len(unique_images), text=f"Analyzed {completed} of {len(unique_images)} pictures")
+                            results_table.dataframe(pd.DataFrame(build_album_rows(album, classified_images, analyzing)), use_container_width=True)
+                        if completed == len(unique_images):
+                            break
+                        time.sleep(0.2)
+                finally:
+                    # On interruption, drop uploads that haven't started instead of waiting for the whole album
+                    executor.shutdown(wait=False, cancel_futures=True)
+
+                failed_hashes = [image_hash for image_hash in unique_images if classified_images[image_hash]['Status'] == 'Failed']
+                if failed_hashes and st.button(f"Retry {len(failed_hashes)} failed picture(s) 🔄"):
+                    for image_hash in failed_hashes:
+                        del classified_images[image_hash]
+                    st.experimental_rerun()
+
+                results_df = pd.DataFrame(build_album_rows(album, classified_images))
+
+                # Download buttons for the classification results
+                col1, col2 = st.columns(2)
+                with col1:
+                    csv = results_df.to_csv(index=False).encode('utf-8')
+                    st.download_button(
+                        label="Download Results (CSV)",
+                        data=csv,
+                        file_name='food_classification.csv',
+                        mime='text/csv',
+                    )
+                with col2:
+                    parquet_buffer = io.BytesIO()
+                    results_df.to_parquet(parquet_buffer, index=False)
+                    st.download_button(
+                        label="Download Results (Parquet)",
+                        data=parquet_buffer.getvalue(),
+                        file_name='food_classification.parquet',
+                        mime='application/octet-stream',
+                    )
+
+                # Footer
+                st.markdown("---")
+                st.markdown(
+                    """
+                    <div style="text-align: center; padding: 10px 0;">
+                        <p>Copyright © 2024 Lumine All rights reserved. Made with <span style="color: red;">&#10084;</span> by Singh AmanDeep</p>
+                    </div>
+                    """,
+                    unsafe_allow_html=True
+                    )